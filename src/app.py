@@ -9,7 +9,7 @@ async def process_pdf(pdf_path, query):
     vector_store = PDFVectorStore()
 
     # Add PDF to vector store
-    vector_store.add_pdf(pdf_path)
+    await vector_store.add_pdf(pdf_path)
 
     # Search for relevant chunks
     relevant_chunks = vector_store.search(query)
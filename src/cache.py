@@ -1,26 +1,151 @@
 import asyncio
+import functools
 import json
 import os
-from hashlib import md5
+import pickle
+import time
+from collections import OrderedDict
+from hashlib import blake2b
 from diskcache import Cache
 from pydantic import BaseModel
 from typing import Optional
 
+@functools.lru_cache(maxsize=256)
+def _schema_for(cls) -> str:
+    """Serialized JSON schema of a pydantic model class, computed once per class"""
+    return json.dumps(cls.model_json_schema(), sort_keys=True)
+
+def _update_with_field(hasher, data: bytes) -> None:
+    """Feed one length-prefixed field into an incremental hasher"""
+    hasher.update(len(data).to_bytes(8, "little"))
+    hasher.update(data)
+
+def _update_with_message(hasher, message: dict) -> None:
+    """
+    Feed one chat message into an incremental hasher, field by field.
+    Fields are length-prefixed and each value is tagged as a raw string (s)
+    or JSON (j), so no content can mimic the framing or another value type.
+    """
+    hasher.update(b"m")
+    hasher.update(len(message).to_bytes(8, "little"))
+    for field in sorted(message):
+        value = message[field]
+        _update_with_field(hasher, field.encode('utf-8'))
+        if isinstance(value, str):
+            hasher.update(b"s")
+        else:
+            hasher.update(b"j")
+            value = json.dumps(value, sort_keys=True)
+        _update_with_field(hasher, value.encode('utf-8'))
+
+@functools.lru_cache(maxsize=256)
+def _prefix_hasher(key_prefix: str, model: str, schema: Optional[str], system_prompts: tuple):
+    """
+    Hasher primed with the parts of a chat request that repeat across calls.
+    Shared between calls, so callers must hash into a .copy() of it.
+    """
+    hasher = blake2b(digest_size=16)
+    _update_with_field(hasher, json.dumps([key_prefix, model, schema]).encode('utf-8'))
+    for content in system_prompts:
+        _update_with_message(hasher, {"role": "system", "content": content})
+    return hasher
+
+def _finish_key(hasher, messages, kwargs: dict) -> str:
+    """Feed the remaining messages and kwargs into a hasher and return its digest"""
+    for message in messages:
+        _update_with_message(hasher, message)
+
+    hasher.update(b"k")
+    _update_with_field(hasher, json.dumps(kwargs, sort_keys=True).encode('utf-8'))
+    return hasher.hexdigest()
+
+def _is_plain_system_message(message: dict) -> bool:
+    return (
+        message.keys() == {"role", "content"}
+        and message["role"] == "system"
+        and isinstance(message["content"], str)
+    )
+
+# Python hashes of recently seen system prompts. Only prompts seen before join
+# the memoized prefix, so one-off prompts (e.g. per-query RAG context) never
+# become _prefix_hasher keys.
+_SEEN_SYSTEM_PROMPTS = OrderedDict()
+_SEEN_SYSTEM_PROMPTS_SIZE = 1024
+
+def _seen_before(content: str) -> bool:
+    """Record a system prompt and report whether it had been seen already"""
+    marker = hash(content)
+    if marker in _SEEN_SYSTEM_PROMPTS:
+        _SEEN_SYSTEM_PROMPTS.move_to_end(marker)
+        return True
+
+    _SEEN_SYSTEM_PROMPTS[marker] = None
+    if len(_SEEN_SYSTEM_PROMPTS) > _SEEN_SYSTEM_PROMPTS_SIZE:
+        _SEEN_SYSTEM_PROMPTS.popitem(last=False)
+    return False
+
 class CacheResult:
-    def __init__(self, directory=".cached_data"):
+    def __init__(self, directory=".cached_data", memory_size=1024):
         os.makedirs(directory, exist_ok=True)
         self.cache = Cache(directory=directory)
+        # In-process LRU in front of the disk cache for hot keys
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._MISS = object()
+
+    def _remember(self, key, val, expire_time=None):
+        # Values are kept pickled, like on disk, so every hit returns a fresh
+        # copy and callers mutating a result cannot change the cache.
+        # expire_time is an absolute time.time() deadline, as diskcache stores it
+        self._memory[key] = (
+            pickle.dumps(val, protocol=pickle.HIGHEST_PROTOCOL),
+            expire_time
+        )
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
 
     async def set_async(self, key, val, **kwargs):
+        # Options other than expire (read, tag, ...) change how diskcache
+        # stores the value, so those writes go straight to disk
+        if set(kwargs) - {"expire"}:
+            self._memory.pop(key, None)
+            return await asyncio.to_thread(self.cache.set, key, val, **kwargs)
+
+        # Write-through: memory first, then disk
+        expire = kwargs.get("expire")
+        self._remember(key, val, None if expire is None else time.time() + expire)
         return await asyncio.to_thread(self.cache.set, key, val, **kwargs)
 
     async def get_async(self, key, default=None, **kwargs):
-        return await asyncio.to_thread(self.cache.get, key, default, **kwargs)
+        # Options such as read/expire_time/tag change what diskcache returns,
+        # so those lookups go straight to disk
+        if kwargs:
+            return await asyncio.to_thread(self.cache.get, key, default, **kwargs)
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            data, expire_time = entry
+            if expire_time is None or expire_time > time.time():
+                self._memory.move_to_end(key)
+                return pickle.loads(data)
+            del self._memory[key]
+
+        # With expire_time=True diskcache returns (default, None) on a miss
+        val, expire_time = await asyncio.to_thread(
+            self.cache.get, key, self._MISS, expire_time=True
+        )
+        if val is self._MISS:
+            return default
+
+        self._remember(key, val, expire_time)
+        return val
 
     @staticmethod
     def make_cache_key(key_name, **kwargs):
-        kwargs_string = json.dumps(kwargs, sort_keys=True)
-        kwargs_hash = md5(kwargs_string.encode('utf-8')).hexdigest()
+        # Hash messages piece by piece instead of dumping the whole list
+        messages = kwargs.pop("messages", None) or ()
+        kwargs_hash = _finish_key(blake2b(digest_size=16), messages, kwargs)
         return f"{key_name}__{kwargs_hash}"
 
     def make_chat_completion_key(
@@ -31,16 +156,26 @@ class CacheResult:
             response_format: Optional[BaseModel] = None,
             **kwargs
     ) -> str:
-        base_params = {
-            "model": model,
-            "messages": messages,
-            **kwargs
-        }
-        
         if response_format:
-            base_params["response_format"] = response_format.model_json_schema()
+            if not isinstance(response_format, type):
+                response_format = type(response_format)
+            schema = _schema_for(response_format)
             key_prefix = "openai_chat_completion_structured"
         else:
+            schema = None
             key_prefix = "openai_chat_completion"
-            
-        return self.make_cache_key(key_prefix, **base_params)
\ No newline at end of file
+
+        # Leading system prompts are usually reused between calls, so the hash
+        # of model + schema + repeated system prompts is computed once and
+        # copied. The framing makes the digest independent of where the
+        # prefix ends, so a prompt's first and later uses get the same key.
+        num_prefix = 0
+        for message in messages:
+            if not (_is_plain_system_message(message) and _seen_before(message["content"])):
+                break
+            num_prefix += 1
+        system_prompts = tuple(m["content"] for m in messages[:num_prefix])
+
+        hasher = _prefix_hasher(key_prefix, model, schema, system_prompts).copy()
+        kwargs_hash = _finish_key(hasher, messages[num_prefix:], kwargs)
+        return f"{key_prefix}__{kwargs_hash}"
\ No newline at end of file
@@ -1,37 +1,83 @@
 from typing import TypeVar, Optional, Union, Type
+import asyncio
 import backoff
 import json
-from openai import OpenAI
+import weakref
+import openai
 from langfuse.openai import AsyncOpenAI
-from openai.types.chat import ChatCompletion
-from openai.types.chat.chat_completion import ParsedChatCompletion
+from openai.types.chat import ChatCompletion, ParsedChatCompletion
 from pydantic import BaseModel
 from .cache import CacheResult
 from .exceptions import APICallError
 
+# Shared default clients, one per event loop: a client's connection pool is
+# bound to the loop it first ran on and breaks once that loop is closed
+_DEFAULT_CLIENTS = weakref.WeakKeyDictionary()
+
+def _default_client() -> AsyncOpenAI:
+    """Lazily create the AsyncOpenAI client shared by all handlers on the running loop"""
+    loop = asyncio.get_running_loop()
+    client = _DEFAULT_CLIENTS.get(loop)
+    if client is None:
+        client = _DEFAULT_CLIENTS[loop] = AsyncOpenAI()
+    return client
+
 class CachedChatCompletions:
     def __init__(self, 
-                 client: Optional[OpenAI] = None, 
+                 client: Optional[AsyncOpenAI] = None, 
                  cache: Optional[CacheResult] = None):
         """
         Initialize the cached chat completions handler.
         
-        :param client: OpenAI client (will create a default one if not provided)
+        :param client: AsyncOpenAI client (will use a shared per-event-loop default if not provided)
         :param cache: AICache instance (will create a default one if not provided)
         """
-        self.client = client or OpenAI()
+        self._client = client
         self.cache = cache or CacheResult()
         self.CACHE_MISS_SENTINEL = object()
+        # API calls in progress, keyed by cache key
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Resolved per call so the default client matches the running loop
+        return self._client or _default_client()
+
+    @backoff.on_exception(
+        backoff.expo,
+        (
+            openai.APIConnectionError,
+            openai.APITimeoutError,
+            openai.RateLimitError,
+            openai.InternalServerError
+        ),
+        max_tries=5,
+        jitter=backoff.full_jitter
+    )
+    async def _request(self, is_structured: bool, **kwargs):
+        # Only transient errors are retried; everything else fails fast
+        if is_structured:
+            return await self.client.beta.chat.completions.parse(**kwargs)
+        return await self.client.chat.completions.create(**kwargs)
 
-    @backoff.on_exception(backoff.expo, Exception)
     async def _make_api_call(self, is_structured: bool, **kwargs):
         try:
-            if is_structured:
-                return await self.client.beta.chat.completions.parse(**kwargs)
-            return await self.client.chat.completions.create(**kwargs)
+            return await self._request(is_structured=is_structured, **kwargs)
         except Exception as e:
             raise APICallError(f"API call failed: {str(e)}") from e
 
+    async def _fetch_and_cache(self, cache_key: str, is_structured: bool, **kwargs):
+        completion = await self._make_api_call(is_structured=is_structured, **kwargs)
+        # diskcache pickles the dict, so hits skip JSON parsing
+        await self.cache.set_async(cache_key, completion.model_dump())
+        return completion
+
+    def _finish_inflight(self, cache_key: str, task: asyncio.Task):
+        self._inflight.pop(cache_key, None)
+        # Mark a failure as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
     async def get_completion(
             self,
             *,
@@ -64,31 +110,43 @@ class CachedChatCompletions:
         )
 
         if cached_value is self.CACHE_MISS_SENTINEL:
-            # Cache miss - make API call
-            completion = await self._make_api_call(
-                is_structured=is_structured,
-                model=model,
-                messages=messages,
-                response_format=response_format if is_structured else None,
-                **kwargs
-            )
-            await self.cache.set_async(cache_key, completion.json())
-            return completion
+            # Cache miss - make API call, shared with identical concurrent requests
+            task = self._inflight.get(cache_key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_and_cache(
+                    cache_key,
+                    is_structured=is_structured,
+                    model=model,
+                    messages=messages,
+                    response_format=response_format if is_structured else None,
+                    **kwargs
+                ))
+                self._inflight[cache_key] = task
+                task.add_done_callback(
+                    lambda done: self._finish_inflight(cache_key, done)
+                )
+                # Shield so one cancelled caller does not cancel the shared call
+                return await asyncio.shield(task)
+
+            # Followers get their own copy, as they would from a cache hit
+            completion = await asyncio.shield(task)
+            return completion.model_copy(deep=True)
         else:
+            # Entries written before the switch to pickled dicts are JSON strings
+            if isinstance(cached_value, str):
+                cached_value = json.loads(cached_value)
+
             # Cache hit - parse response
             if is_structured:
-                completion = ParsedChatCompletion.model_validate(
-                    json.loads(cached_value)
+                # Parametrize with the response model so `parsed` is validated
+                # in the same pass as the rest of the completion
+                if not isinstance(response_format, type):
+                    response_format = type(response_format)
+                return ParsedChatCompletion[response_format].model_validate(
+                    cached_value
                 )
-                # Handle structured response parsing
-                for choice in completion.choices:
-                    if not choice.message.refusal:
-                        choice.message.parsed = response_format.model_validate(
-                            choice.message.parsed
-                        )
-                return completion
             else:
-                return ChatCompletion.model_validate(json.loads(cached_value))
+                return ChatCompletion.model_validate(cached_value)
             
 
     def extract_response(self, completion):
@@ -1,24 +1,62 @@
+import asyncio
 import os
 import io
+import re
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Union
 
 import chromadb
+import numpy as np
+import pypdfium2 as pdfium
 import torch
 from pypdf import PdfReader
 from sentence_transformers import SentenceTransformer
 
+# Matches one whitespace-delimited word
+_WORD_PATTERN = re.compile(r"\S+")
+
+# Chroma persists vectors (SQLite and HNSW segments) as float32 and upcasts
+# anything narrower on insert, so casting to float16 first would only lose
+# precision without saving any bytes. Embeddings are handed over as float32,
+# which on CUDA is a single cast of the half-precision model output.
+EMBEDDING_DTYPE = np.float32
+
+# Ingestion pipeline settings
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_TIMEOUT = 0.2  # seconds to wait for a batch to fill
+PIPELINE_QUEUE_SIZE = 4
+
+# PDFium keeps process-wide state and neither it nor PdfReader is safe to use
+# from several threads, so every page of every PDF is read on this one thread
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-extract")
+
+# Marks the end of a pipeline stage's output
+_END_OF_STREAM = object()
+
+# HNSW index parameters for the Chroma collection
+HNSW_METADATA = {
+    "hnsw:space": "cosine",  # Use cosine similarity
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
 class PDFVectorStore:
     def __init__(
         self, 
         collection_name: str = "pdf_collection", 
-        persist_directory: str = ".vectorstore"
+        persist_directory: str = ".vectorstore",
+        min_vectors_for_ann: int = 1000
     ):
         """
         Initialize a vector store for PDF documents
         
         :param collection_name: Name of the collection in the vector database
         :param persist_directory: Directory to persist vector database
+        :param min_vectors_for_ann: Number of vectors kept in the brute-force
+            buffer before they are indexed into HNSW (only applied when the
+            collection is created)
         """
         # Ensure persistence directory exists
         os.makedirs(persist_directory, exist_ok=True)
@@ -29,11 +67,28 @@ class PDFVectorStore:
         # Create or get collection
         self.collection = self.chroma_client.get_or_create_collection(
             name=collection_name,
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
+            metadata={
+                **HNSW_METADATA,
+                # Small collections are searched by brute force; HNSW is only
+                # built once the buffer holds min_vectors_for_ann vectors
+                "hnsw:batch_size": min_vectors_for_ann,
+                "hnsw:sync_threshold": max(min_vectors_for_ann, 1000)
+            }
         )
         
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Initialize embedding model on the fastest available device
+        if torch.cuda.is_available():
+            device = "cuda"
+        elif torch.backends.mps.is_available():
+            device = "mps"
+        else:
+            device = "cpu"
+
+        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+
+        # Half precision on CUDA for faster encoding
+        if device == "cuda":
+            self.embedding_model.half()
 
     def _generate_document_id(self, pdf_path: str, page_number: int) -> str:
         """
@@ -45,7 +100,194 @@ class PDFVectorStore:
         """
         return hashlib.md5(f"{pdf_path}_page_{page_number}".encode()).hexdigest()
 
-    def add_pdf(
+    def _hash_file(self, pdf_path: str) -> str:
+        """
+        Hash the contents of a file
+
+        :param pdf_path: Path to the file
+        :return: Hex digest of the file contents
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(pdf_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def _iter_page_texts(self, pdf_path: str):
+        """
+        Extract the text of a PDF page by page
+
+        :param pdf_path: Path to the PDF file
+        :return: Generator of page texts, in page order
+        """
+        reader = None
+
+        doc = pdfium.PdfDocument(pdf_path)
+        try:
+            for page_num, page in enumerate(doc):
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+
+                # Fall back to pypdf for pages PDFium finds no text on
+                if not text.strip():
+                    if reader is None:
+                        reader = PdfReader(pdf_path)
+                    text = reader.pages[page_num].extract_text()
+
+                yield text
+        finally:
+            doc.close()
+
+    def _encode_chunks(self, chunks: List[str]):
+        """
+        Embed a batch of chunks with the embedding model
+
+        :param chunks: Text chunks to embed
+        :return: Normalized embeddings, one row per chunk
+        """
+        with torch.inference_mode():
+            embeddings = self.embedding_model.encode(
+                chunks,
+                batch_size=EMBED_BATCH_SIZE,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        return embeddings.astype(EMBEDDING_DTYPE, copy=False)
+
+    async def _extract_stage(self, pdf_path: str, page_queue: asyncio.Queue):
+        """
+        Pipeline stage: push (page number, text) for each page of the PDF
+
+        :param pdf_path: Path to the PDF file
+        :param page_queue: Output queue of extracted pages
+        """
+        loop = asyncio.get_running_loop()
+
+        # All extraction runs on the shared _PDF_EXECUTOR thread, so concurrent
+        # add_pdf calls never call into PDFium at the same time
+        pages = self._iter_page_texts(pdf_path)
+        try:
+            page_num = 0
+            while True:
+                text = await loop.run_in_executor(
+                    _PDF_EXECUTOR, next, pages, _END_OF_STREAM
+                )
+                if text is _END_OF_STREAM:
+                    break
+                await page_queue.put((page_num, text))
+                page_num += 1
+        finally:
+            await loop.run_in_executor(_PDF_EXECUTOR, pages.close)
+
+        await page_queue.put(_END_OF_STREAM)
+
+    async def _chunk_stage(
+        self,
+        pdf_path: str,
+        file_hash: str,
+        chunk_size: int,
+        overlap: int,
+        page_queue: asyncio.Queue,
+        chunk_queue: asyncio.Queue
+    ):
+        """
+        Pipeline stage: split pages into chunks with their IDs and metadata
+
+        :param pdf_path: Path to the PDF file
+        :param file_hash: Hash of the PDF contents
+        :param chunk_size: Number of tokens per chunk
+        :param overlap: Number of tokens to overlap between chunks
+        :param page_queue: Input queue of extracted pages
+        :param chunk_queue: Output queue of (id, chunk, metadata) tuples
+        """
+        while (item := await page_queue.get()) is not _END_OF_STREAM:
+            page_num, text = item
+            doc_id = self._generate_document_id(pdf_path, page_num)
+
+            for i, chunk in enumerate(self._chunk_text(text, chunk_size, overlap)):
+                await chunk_queue.put((
+                    f"{doc_id}_chunk_{i}",
+                    chunk,
+                    {
+                        "source": pdf_path,
+                        "page": page_num,
+                        "chunk": i,
+                        "file_hash": file_hash
+                    }
+                ))
+
+        await chunk_queue.put(_END_OF_STREAM)
+
+    async def _embed_stage(
+        self,
+        chunk_queue: asyncio.Queue,
+        batch_queue: asyncio.Queue
+    ):
+        """
+        Pipeline stage: embed chunks in batches of up to EMBED_BATCH_SIZE,
+        flushing early when no chunk arrives within EMBED_BATCH_TIMEOUT
+
+        :param chunk_queue: Input queue of (id, chunk, metadata) tuples
+        :param batch_queue: Output queue of (ids, chunks, embeddings, metadatas)
+        """
+        batch = []
+        done = False
+
+        while not done:
+            timed_out = False
+            if batch:
+                # asyncio.wait (unlike wait_for) never swallows a cancellation
+                getter = asyncio.ensure_future(chunk_queue.get())
+                try:
+                    await asyncio.wait({getter}, timeout=EMBED_BATCH_TIMEOUT)
+                finally:
+                    if not getter.done():
+                        getter.cancel()
+                        timed_out = True
+                item = None if timed_out else getter.result()
+            else:
+                item = await chunk_queue.get()
+
+            if item is _END_OF_STREAM:
+                done = True
+            elif not timed_out:
+                batch.append(item)
+
+            if batch and (done or timed_out or len(batch) >= EMBED_BATCH_SIZE):
+                ids, docs, metas = (list(column) for column in zip(*batch))
+                embeddings = await asyncio.to_thread(self._encode_chunks, docs)
+                await batch_queue.put((ids, docs, embeddings, metas))
+                batch = []
+
+        await batch_queue.put(_END_OF_STREAM)
+
+    async def _insert_stage(self, batch_queue: asyncio.Queue):
+        """
+        Pipeline stage: write embedded batches to the collection
+
+        :param batch_queue: Input queue of (ids, chunks, embeddings, metadatas)
+        :return: ID and metadata of the first chunk written, or None
+        """
+        first = None
+
+        while (item := await batch_queue.get()) is not _END_OF_STREAM:
+            ids, docs, embeddings, metas = item
+            if first is None:
+                first = (ids[0], metas[0])
+            await asyncio.to_thread(
+                self.collection.upsert,
+                ids=ids,
+                documents=docs,
+                embeddings=embeddings,
+                metadatas=metas
+            )
+
+        return first
+
+    async def add_pdf(
         self, 
         pdf_path: str, 
         chunk_size: int = 300, 
@@ -58,33 +300,61 @@ class PDFVectorStore:
         :param chunk_size: Number of tokens per chunk
         :param overlap: Number of tokens to overlap between chunks
         """
-        # Read PDF
-        reader = PdfReader(pdf_path)
-        
-        # Process each page
-        for page_num, page in enumerate(reader.pages):
-            # Extract text
-            text = page.extract_text()
-            
-            # Chunk the text
-            chunks = self._chunk_text(text, chunk_size, overlap)
-            
-            # Add chunks to vector store
-            embeddings = self.embedding_model.encode(chunks)
-            
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc_id = self._generate_document_id(pdf_path, page_num)
-                
-                self.collection.add(
-                    ids=[f"{doc_id}_chunk_{i}"],
-                    documents=[chunk],
-                    embeddings=[embedding.tolist()],
-                    metadatas=[{
-                        "source": pdf_path,
-                        "page": page_num,
-                        "chunk": i
-                    }]
-                )
+        # Skip PDFs already fully ingested from this path with these contents
+        file_hash = await asyncio.to_thread(self._hash_file, pdf_path)
+        existing = await asyncio.to_thread(
+            self.collection.get,
+            where={"$and": [
+                {"source": pdf_path},
+                {"file_hash": file_hash},
+                {"ingested": True}
+            ]},
+            limit=1,
+            include=[]
+        )
+        if existing['ids']:
+            return
+
+        # Chunk IDs derive from the path, so drop rows from an older version of
+        # this file (or from before file hashes were stored) before re-adding
+        await asyncio.to_thread(self.collection.delete, where={"source": pdf_path})
+
+        # Stream extract -> chunk -> embed -> insert through bounded queues so
+        # the stages overlap and only a few batches are held in memory at once
+        page_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        chunk_queue = asyncio.Queue(maxsize=EMBED_BATCH_SIZE)
+        batch_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        tasks = [
+            asyncio.create_task(self._extract_stage(pdf_path, page_queue)),
+            asyncio.create_task(self._chunk_stage(
+                pdf_path, file_hash, chunk_size, overlap, page_queue, chunk_queue
+            )),
+            asyncio.create_task(self._embed_stage(chunk_queue, batch_queue)),
+            asyncio.create_task(self._insert_stage(batch_queue))
+        ]
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others blocked on their queues
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Do not leave a partially ingested PDF behind
+            await asyncio.to_thread(self.collection.delete, where={"source": pdf_path})
+            raise
+
+        # Mark the PDF as ingested only once every batch has been written, so
+        # an interrupted run is redone by the next call
+        first = tasks[-1].result()
+        if first is not None:
+            first_id, first_meta = first
+            await asyncio.to_thread(
+                self.collection.update,
+                ids=[first_id],
+                metadatas=[{**first_meta, "ingested": True}]
+            )
 
     def _chunk_text(
         self, 
@@ -101,13 +371,15 @@ class PDFVectorStore:
         :return: List of text chunks
         """
         # Simple tokenization (can be replaced with more sophisticated method)
-        words = text.split()
+        spans = [match.span() for match in _WORD_PATTERN.finditer(text)]
+        num_words = len(spans)
         chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            chunks.append(chunk)
-        
+
+        # Slice each window straight out of the original text
+        for i in range(0, num_words, chunk_size - overlap):
+            last = min(i + chunk_size, num_words) - 1
+            chunks.append(text[spans[i][0]:spans[last][1]])
+
         return chunks
 
     def search(
@@ -123,21 +395,22 @@ class PDFVectorStore:
         :return: List of most relevant document chunks
         """
         # Generate embedding for query
-        query_embedding = self.embedding_model.encode([query])[0]
+        with torch.inference_mode():
+            query_embedding = self.embedding_model.encode(
+                query,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ).astype(EMBEDDING_DTYPE, copy=False)
         
         # Search in vector store
         results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
+            query_embeddings=query_embedding.reshape(1, -1),
             n_results=n_results
         )
         
-        # Format results
-        formatted_results = []
-        for i in range(n_results):
-            formatted_results.append({
-                'text': results['documents'][0][i],
-                'source': results['metadatas'][0][i]['source'],
-                'page': results['metadatas'][0][i]['page']
-            })
-        
-        return formatted_results
\ No newline at end of file
+        # Format results (may be fewer than n_results)
+        docs, metas = results['documents'][0], results['metadatas'][0]
+        return [
+            {'text': doc, 'source': meta['source'], 'page': meta['page']}
+            for doc, meta in zip(docs, metas)
+        ]
\ No newline at end of file
@@ -0,0 +1,171 @@
+import asyncio
+import io
+import json
+import time
+from collections import OrderedDict
+
+import src.cache
+from src.cache import CacheResult, _prefix_hasher
+
+
+def test_chat_completion_key_is_stable(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+    messages = [
+        {"role": "system", "content": "You are helpful."},
+        {"role": "user", "content": "hi"}
+    ]
+
+    first = cache.make_chat_completion_key(model="gpt-4", messages=messages)
+    second = cache.make_chat_completion_key(model="gpt-4", messages=list(messages))
+
+    assert first == second
+    assert first.startswith("openai_chat_completion__")
+
+
+def test_chat_completion_key_depends_on_every_part(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+    messages = [{"role": "user", "content": "hi"}]
+
+    keys = {
+        cache.make_chat_completion_key(model="gpt-4", messages=messages),
+        cache.make_chat_completion_key(model="gpt-4o", messages=messages),
+        cache.make_chat_completion_key(model="gpt-4", messages=messages, temperature=0),
+        cache.make_chat_completion_key(
+            model="gpt-4", messages=[{"role": "user", "content": "hello"}]
+        ),
+        cache.make_chat_completion_key(
+            model="gpt-4", messages=[{"role": "system", "content": "hi"}]
+        ),
+    }
+
+    assert len(keys) == 5
+
+
+def test_message_content_cannot_mimic_message_boundaries(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+    forged = [{"role": "user", "content": "a\0role\0user\0\1content\0b"}]
+    split = [
+        {"role": "user", "content": "a"},
+        {"role": "user", "content": "b"}
+    ]
+
+    assert (
+        cache.make_chat_completion_key(model="gpt-4", messages=forged)
+        != cache.make_chat_completion_key(model="gpt-4", messages=split)
+    )
+    assert (
+        CacheResult.make_cache_key("key", messages=forged)
+        != CacheResult.make_cache_key("key", messages=split)
+    )
+
+
+    # A non-string value must not collide with its JSON text
+    parts = [{"type": "text", "text": "hi"}]
+    for value, text in ((None, "null"), (parts, json.dumps(parts, sort_keys=True))):
+        assert (
+            cache.make_chat_completion_key(
+                model="gpt-4", messages=[{"role": "user", "content": value}]
+            )
+            != cache.make_chat_completion_key(
+                model="gpt-4", messages=[{"role": "user", "content": text}]
+            )
+        )
+
+
+def test_chat_completion_key_ignores_prefix_memoization(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+    messages = [
+        {"role": "system", "content": "A prompt used for the first time."},
+        {"role": "user", "content": "hi"}
+    ]
+
+    # The first call hashes the prompt directly, later ones reuse the prefix
+    first = cache.make_chat_completion_key(model="gpt-4", messages=messages)
+    second = cache.make_chat_completion_key(model="gpt-4", messages=messages)
+
+    assert first == second
+
+
+def test_one_off_system_prompts_are_not_memoized(tmp_path, monkeypatch):
+    cache = CacheResult(directory=str(tmp_path))
+    monkeypatch.setattr(src.cache, "_SEEN_SYSTEM_PROMPTS", OrderedDict())
+    _prefix_hasher.cache_clear()
+
+    for i in range(5):
+        cache.make_chat_completion_key(model="gpt-4", messages=[
+            {"role": "system", "content": "You analyze documents."},
+            {"role": "system", "content": f"Context from document: {i}"},
+            {"role": "user", "content": "summarize"}
+        ])
+
+    # Only the shared instructions (and the empty prefix) are cached
+    assert _prefix_hasher.cache_info().currsize == 2
+
+
+def test_get_async_serves_hot_keys_from_memory(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+
+    async def run():
+        await cache.set_async("key", {"value": 1})
+        # Drop the disk copy; the memory layer still serves the key
+        cache.cache.delete("key")
+        return await cache.get_async("key")
+
+    assert asyncio.run(run()) == {"value": 1}
+
+
+def test_memory_layer_evicts_least_recently_used(tmp_path):
+    cache = CacheResult(directory=str(tmp_path), memory_size=2)
+
+    async def run():
+        await cache.set_async("a", 1)
+        await cache.set_async("b", 2)
+        await cache.get_async("a")
+        await cache.set_async("c", 3)
+
+    asyncio.run(run())
+
+    assert list(cache._memory) == ["a", "c"]
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+    cache.cache.set("key", "from disk")
+
+    assert asyncio.run(cache.get_async("key")) == "from disk"
+    assert "key" in cache._memory
+
+
+def test_expired_entries_are_not_served_from_memory(tmp_path, monkeypatch):
+    cache = CacheResult(directory=str(tmp_path))
+    now = time.time()
+
+    asyncio.run(cache.set_async("key", "value", expire=10))
+    assert asyncio.run(cache.get_async("key")) == "value"
+
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert asyncio.run(cache.get_async("key", default="missing")) == "missing"
+
+
+def test_mutating_a_returned_value_does_not_change_the_cache(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+
+    async def run():
+        await cache.set_async("key", {"a": 1})
+        hit = await cache.get_async("key")
+        hit["a"] = 2
+        return await cache.get_async("key")
+
+    assert asyncio.run(run()) == {"a": 1}
+
+
+def test_set_with_diskcache_options_bypasses_memory(tmp_path):
+    cache = CacheResult(directory=str(tmp_path))
+
+    async def run():
+        await cache.set_async("key", "stale")
+        await cache.set_async("key", io.BytesIO(b"payload"), read=True)
+        return await cache.get_async("key")
+
+    assert asyncio.run(run()) == b"payload"
+    assert "key" in cache._memory
@@ -0,0 +1,196 @@
+import asyncio
+from types import SimpleNamespace
+
+import backoff._async
+import httpx
+import openai
+import pytest
+from openai.types.chat import ChatCompletion
+
+from src import chat_completions
+from src.cache import CacheResult
+from src.chat_completions import CachedChatCompletions
+from src.exceptions import APICallError
+
+COMPLETION = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "hello"}
+    }]
+}
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def make_handler(tmp_path, create):
+    client = SimpleNamespace(chat=SimpleNamespace(
+        completions=SimpleNamespace(create=create)
+    ))
+    return CachedChatCompletions(
+        client=client,
+        cache=CacheResult(directory=str(tmp_path))
+    )
+
+
+def test_concurrent_identical_requests_share_one_api_call(tmp_path):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.05)
+        return ChatCompletion.model_validate(COMPLETION)
+
+    handler = make_handler(tmp_path, create)
+
+    async def run():
+        return await asyncio.gather(*(
+            handler.get_completion(model="gpt-4", messages=MESSAGES)
+            for _ in range(3)
+        ))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    # Each caller gets its own object
+    assert len({id(r) for r in results}) == 3
+    assert not handler._inflight
+
+
+def test_coalesced_failure_reaches_every_caller(tmp_path):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.05)
+        raise ValueError("bad request")
+
+    handler = make_handler(tmp_path, create)
+
+    async def run():
+        return await asyncio.gather(*(
+            handler.get_completion(model="gpt-4", messages=MESSAGES)
+            for _ in range(2)
+        ), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(isinstance(r, APICallError) for r in results)
+    assert not handler._inflight
+
+
+def test_cache_hit_skips_api_call(tmp_path):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        return ChatCompletion.model_validate(COMPLETION)
+
+    handler = make_handler(tmp_path, create)
+
+    async def run():
+        first = await handler.get_completion(model="gpt-4", messages=MESSAGES)
+        second = await handler.get_completion(model="gpt-4", messages=MESSAGES)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert handler.extract_response(second) == "hello"
+    assert second == first
+
+
+def test_default_client_is_shared_per_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_completions, "AsyncOpenAI", lambda: object())
+    handler = CachedChatCompletions(cache=CacheResult(directory=str(tmp_path)))
+
+    async def clients():
+        other = CachedChatCompletions(cache=handler.cache)
+        return handler.client, other.client
+
+    first, same_loop = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+
+    assert first is same_loop
+    assert first is not second
+
+
+@pytest.fixture
+def retry_waits(monkeypatch):
+    """Record backoff's waits instead of sleeping"""
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(backoff._async, "asyncio", SimpleNamespace(
+        sleep=sleep, iscoroutinefunction=asyncio.iscoroutinefunction
+    ))
+    return waits
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("bad input"),
+    openai.BadRequestError(
+        "bad request",
+        response=httpx.Response(400, request=REQUEST),
+        body=None
+    ),
+])
+def test_non_transient_errors_are_not_retried(tmp_path, retry_waits, error):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        raise error
+
+    handler = make_handler(tmp_path, create)
+
+    with pytest.raises(APICallError):
+        asyncio.run(handler.get_completion(model="gpt-4", messages=MESSAGES))
+
+    assert len(calls) == 1
+    assert retry_waits == []
+
+
+def test_transient_errors_are_retried(tmp_path, retry_waits):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise openai.APIConnectionError(request=REQUEST)
+        return ChatCompletion.model_validate(COMPLETION)
+
+    handler = make_handler(tmp_path, create)
+
+    completion = asyncio.run(
+        handler.get_completion(model="gpt-4", messages=MESSAGES)
+    )
+
+    assert handler.extract_response(completion) == "hello"
+    assert len(calls) == 3
+    assert len(retry_waits) == 2
+
+
+def test_transient_errors_give_up_after_max_tries(tmp_path, retry_waits):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        raise openai.APITimeoutError(request=REQUEST)
+
+    handler = make_handler(tmp_path, create)
+
+    with pytest.raises(APICallError):
+        asyncio.run(handler.get_completion(model="gpt-4", messages=MESSAGES))
+
+    assert len(calls) == 5
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import uuid
+
+import chromadb
+import numpy as np
+import pytest
+
+from src import rag
+from src.rag import PDFVectorStore
+
+
+class FakeEncoder:
+    """Stands in for SentenceTransformer; counts how many chunks it embeds"""
+
+    def __init__(self, fail_on_call=None):
+        self.encoded = 0
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def encode(self, chunks, **kwargs):
+        # A single string gives one vector, as with SentenceTransformer
+        if isinstance(chunks, str):
+            return np.ones(8, dtype=np.float32)
+
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("encoder failed")
+        self.encoded += len(chunks)
+        return np.ones((len(chunks), 8), dtype=np.float32)
+
+
+def make_store():
+    # Skip __init__ so no embedding model is downloaded
+    store = PDFVectorStore.__new__(PDFVectorStore)
+    store.chroma_client = chromadb.EphemeralClient()
+    store.collection = store.chroma_client.create_collection(
+        name=f"test_{uuid.uuid4().hex}",
+        metadata={"hnsw:space": "cosine"}
+    )
+    store.embedding_model = FakeEncoder()
+    store._iter_page_texts = iter_page_texts
+    return store
+
+
+# Threads the fake extractor ran on
+extraction_threads = set()
+
+
+def iter_page_texts(pdf_path):
+    # Pages of the fake PDFs are separated by form feeds
+    with open(pdf_path, encoding="utf-8") as f:
+        for page in f.read().split("\f"):
+            extraction_threads.add(threading.get_ident())
+            yield page
+
+
+def write_pdf(path, *pages):
+    path.write_text("\f".join(pages), encoding="utf-8")
+    return str(path)
+
+
+def stored_rows(store, pdf_path):
+    return store.collection.get(where={"source": pdf_path})
+
+
+def test_add_pdf_is_a_no_op_for_unchanged_contents(tmp_path):
+    store = make_store()
+    pdf_path = write_pdf(tmp_path / "paper.pdf", "alpha beta gamma", "delta epsilon")
+
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+    encoded = store.embedding_model.encoded
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+
+    assert encoded == 3
+    assert store.embedding_model.encoded == encoded
+    assert len(stored_rows(store, pdf_path)["ids"]) == 3
+
+
+def test_add_pdf_replaces_rows_when_the_file_changes(tmp_path):
+    store = make_store()
+    pdf_path = write_pdf(tmp_path / "paper.pdf", "old words here", "more old words")
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+
+    write_pdf(tmp_path / "paper.pdf", "new text")
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+    rows = stored_rows(store, pdf_path)
+
+    assert rows["documents"] == ["new text"]
+    new_hash = store._hash_file(pdf_path)
+    assert all(meta["file_hash"] == new_hash for meta in rows["metadatas"])
+
+    # The new hash is stored, so the next call is a no-op again
+    encoded = store.embedding_model.encoded
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+    assert store.embedding_model.encoded == encoded
+
+
+def test_failed_ingest_leaves_no_rows_and_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "EMBED_BATCH_SIZE", 2)
+    store = make_store()
+    store.embedding_model = FakeEncoder(fail_on_call=2)
+    pdf_path = write_pdf(tmp_path / "paper.pdf", " ".join(f"w{i}" for i in range(10)))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.add_pdf(pdf_path, chunk_size=1, overlap=0))
+
+    assert stored_rows(store, pdf_path)["ids"] == []
+
+    store.embedding_model = FakeEncoder()
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=1, overlap=0))
+
+    assert store.embedding_model.encoded == 10
+    assert len(stored_rows(store, pdf_path)["ids"]) == 10
+
+
+def test_rows_without_ingested_marker_do_not_count_as_ingested(tmp_path):
+    store = make_store()
+    pdf_path = write_pdf(tmp_path / "paper.pdf", "alpha beta gamma")
+
+    # What an interrupted run (e.g. a killed process) leaves behind
+    store.collection.add(
+        ids=["partial"],
+        documents=["alpha beta"],
+        embeddings=[[1.0] * 8],
+        metadatas=[{
+            "source": pdf_path,
+            "page": 0,
+            "chunk": 0,
+            "file_hash": store._hash_file(pdf_path)
+        }]
+    )
+
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+    rows = stored_rows(store, pdf_path)
+
+    assert store.embedding_model.encoded == 2
+    assert "partial" not in rows["ids"]
+    assert sum(bool(meta.get("ingested")) for meta in rows["metadatas"]) == 1
+
+
+def test_pipeline_embeds_in_bounded_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "EMBED_BATCH_SIZE", 2)
+    store = make_store()
+    pdf_path = write_pdf(tmp_path / "paper.pdf", "a b c", "d e")
+
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=1, overlap=0))
+
+    assert store.embedding_model.calls == 3
+    assert len(stored_rows(store, pdf_path)["ids"]) == 5
+
+
+def test_paths_sharing_contents_are_ingested_independently(tmp_path):
+    store = make_store()
+    a_path = write_pdf(tmp_path / "a.pdf", "shared words here")
+    b_path = write_pdf(tmp_path / "b.pdf", "shared words here")
+
+    asyncio.run(store.add_pdf(a_path, chunk_size=2, overlap=0))
+    asyncio.run(store.add_pdf(b_path, chunk_size=2, overlap=0))
+
+    assert len(stored_rows(store, b_path)["ids"]) == 2
+
+    # Changing one copy must not remove the other's rows
+    write_pdf(tmp_path / "a.pdf", "different text")
+    asyncio.run(store.add_pdf(a_path, chunk_size=2, overlap=0))
+
+    assert stored_rows(store, a_path)["documents"] == ["different text"]
+    assert stored_rows(store, b_path)["documents"] == ["shared words", "here"]
+
+
+def test_concurrent_ingests_extract_on_one_thread(tmp_path):
+    store = make_store()
+    paths = [
+        write_pdf(tmp_path / f"paper{i}.pdf", *(f"page {i} {n}" for n in range(5)))
+        for i in range(3)
+    ]
+    extraction_threads.clear()
+
+    async def run():
+        await asyncio.gather(*(
+            store.add_pdf(path, chunk_size=2, overlap=0) for path in paths
+        ))
+
+    asyncio.run(run())
+
+    assert len(extraction_threads) == 1
+    assert threading.get_ident() not in extraction_threads
+    assert all(len(stored_rows(store, path)["ids"]) == 10 for path in paths)
+
+
+def test_search_returns_fewer_results_than_requested(tmp_path):
+    store = make_store()
+    pdf_path = write_pdf(tmp_path / "paper.pdf", "alpha beta gamma")
+    asyncio.run(store.add_pdf(pdf_path, chunk_size=2, overlap=0))
+
+    results = store.search("alpha", n_results=3)
+
+    assert len(results) == 2
+    assert {r["text"] for r in results} == {"alpha beta", "gamma"}
+    assert all(r["source"] == pdf_path and r["page"] == 0 for r in results)